@@ -0,0 +1,92 @@
+# inventree_shopify_inventory_sync/cassette.py
+import gzip
+import json
+import time
+from collections import defaultdict, deque
+from urllib.parse import urlsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+
+class Cassette:
+    """
+    Zeichnet Shopify-Requests samt Antwort (Status, Header wie Link und
+    X-Shopify-Shop-Api-Call-Limit, Body, Dauer) in eine gzip-JSON-Lines-Datei auf
+    (mode="record") oder spielt sie offline wieder ab (mode="replay").
+
+    `speed` beim Abspielen: 0 = ohne Wartezeit, 1.0 = Original-Timing, 2.0 = doppelt so schnell.
+    Request-Header (Access Token) werden nicht gespeichert.
+    """
+
+    def __init__(self, path: str, mode: str = "replay", speed: float = 0.0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.speed = max(0.0, float(speed or 0))
+        self._entries = []
+        self._queues = defaultdict(deque)
+        self._last = {}
+        self.calls = 0
+
+        if mode == "replay":
+            with gzip.open(path, "rt", encoding="utf-8") as fh:
+                for line in fh:
+                    if line.strip():
+                        e = json.loads(line)
+                        self._queues[e["key"]].append(e)
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    @staticmethod
+    def _key(method: str, url: str, params=None, body=None) -> str:
+        # ohne Host, damit eine Aufnahme unabhängig von der konfigurierten Shop-Domain abspielbar ist
+        u = urlsplit(url)
+        p = sorted((str(k), str(v)) for k, v in (params or {}).items())
+        return json.dumps([method.upper(), u.path, u.query, p, body], sort_keys=True, ensure_ascii=False)
+
+    def record(self, method: str, url: str, params, body, response: requests.Response, elapsed: float):
+        self.calls += 1
+        self._entries.append({
+            "key": self._key(method, url, params, body),
+            "status": response.status_code,
+            "reason": response.reason,
+            "headers": dict(response.headers),
+            "body": response.text,
+            "elapsed": round(elapsed, 4),
+        })
+
+    def play(self, method: str, url: str, params=None, body=None) -> requests.Response:
+        key = self._key(method, url, params, body)
+        queue = self._queues.get(key)
+        if queue:
+            e = queue.popleft()
+            self._last[key] = e
+        else:
+            # gleiche Anfrage öfter als aufgezeichnet → letzte Antwort wiederverwenden
+            e = self._last.get(key)
+        if e is None:
+            raise requests.ConnectionError(f"Request not in cassette: {method.upper()} {url}")
+        self.calls += 1
+
+        if self.speed > 0:
+            time.sleep(e["elapsed"] / self.speed)
+
+        r = requests.Response()
+        r.status_code = e["status"]
+        r.reason = e.get("reason") or ""
+        r.headers = CaseInsensitiveDict(e["headers"])
+        r._content = (e["body"] or "").encode("utf-8")
+        r.encoding = "utf-8"
+        r.url = url
+        return r
+
+    def save(self):
+        if self.mode != "record":
+            return
+        with gzip.open(self.path, "wt", encoding="utf-8") as fh:
+            for e in self._entries:
+                fh.write(json.dumps(e, ensure_ascii=False) + "\n")
@@ -0,0 +1,115 @@
+# inventree_shopify_inventory_sync/management/commands/shopify_sync_profile.py
+import cProfile
+import io
+import pstats
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+
+from plugin.registry import registry
+
+from ...cassette import Cassette
+from ...sync import _iter_parts, _prepare, _sync_parts
+
+SLUG = "shopify-inventory-sync"
+
+
+class Command(BaseCommand):
+    help = (
+        "Profiliert einen vollständigen Sync-Lauf gegen eine Cassette (aufgezeichnete "
+        "Shopify-Antworten) unter cProfile und zeigt die grössten Hotspots; mit --memory "
+        "stattdessen ein separater Durchlauf unter tracemalloc."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("cassette", help="Pfad zur Cassette (gzip JSON-Lines)")
+        parser.add_argument("--record", action="store_true",
+                            help="gegen das echte Shopify laufen und die Antworten in die Cassette schreiben")
+        parser.add_argument("--speed", type=float, default=0.0,
+                            help="Abspielgeschwindigkeit: 0 = ohne Wartezeit, 1 = Original-Timing")
+        parser.add_argument("--top", type=int, default=25, help="Anzahl Hotspots in der Ausgabe")
+        parser.add_argument("--memory", action="store_true",
+                            help="Speicher-Durchlauf unter tracemalloc statt cProfile (verfälscht sonst die Laufzeiten)")
+        parser.add_argument("--apply", action="store_true",
+                            help="Buchungen ausführen (nur mit --record; Standard: Dry-Run)")
+        parser.add_argument("--profile-out", default="", help="cProfile-Daten zusätzlich in diese Datei schreiben")
+
+    def handle(self, *args, **options):
+        plugin = registry.get_plugin(SLUG)
+        if plugin is None:
+            raise CommandError("plugin not loaded")
+
+        mode = "record" if options["record"] else "replay"
+        if options["apply"] and mode == "replay":
+            # aufgezeichnete Shopify-Bestände dürfen nicht in die echte Datenbank gebucht werden
+            raise CommandError("--apply ist nur zusammen mit --record erlaubt")
+        try:
+            cassette = Cassette(options["cassette"], mode=mode, speed=options["speed"])
+        except OSError as e:
+            raise CommandError(f"Cassette nicht lesbar: {e}")
+
+        # vollständiger Lauf: keine Teile- oder Zeitbegrenzung
+        overrides = {"cassette": cassette, "dry_run": not options["apply"], "max_parts": 0, "deadline_s": 0}
+        if cassette.replaying:
+            # beim Abspielen gibt es keine API zu schonen; Zugangsdaten werden nicht gebraucht
+            overrides.update({"throttle_ms": 0, "breaker_threshold": 0})
+            overrides["domain"] = plugin.get_setting("shop_domain") or "replay.myshopify.com"
+            overrides["token"] = plugin.get_setting("admin_api_token") or "replay"
+
+        cfg, target_location, error = _prepare(plugin, **overrides)
+        if error:
+            raise CommandError(error)
+
+        top = max(1, options["top"])
+        if options["memory"]:
+            self._memory_pass(plugin, cfg, target_location, cassette, mode, top)
+        else:
+            self._cpu_pass(plugin, cfg, target_location, cassette, mode, top, options["profile_out"])
+
+    def _summary(self, res: dict, mode: str, cassette: Cassette, elapsed: float, extra: str = ""):
+        res.pop("details_preview", None)
+        res.pop("last_pk", None)
+        self.stdout.write(f"mode={mode} requests={cassette.calls} elapsed={elapsed:.2f}s{extra}")
+        self.stdout.write(" ".join(f"{k}={v}" for k, v in res.items()))
+
+    def _cpu_pass(self, plugin, cfg, target_location, cassette, mode, top, profile_out):
+        profiler = cProfile.Profile()
+        t0 = time.perf_counter()
+        profiler.enable()
+        try:
+            res = _sync_parts(_iter_parts(plugin), cfg, target_location, None)
+        finally:
+            profiler.disable()
+            elapsed = time.perf_counter() - t0
+            cassette.save()
+
+        self._summary(res, mode, cassette, elapsed)
+
+        buf = io.StringIO()
+        stats = pstats.Stats(profiler, stream=buf)
+        stats.sort_stats("cumulative").print_stats(top)
+        self.stdout.write("\n--- cProfile (cumulative) ---")
+        self.stdout.write(buf.getvalue())
+
+        if profile_out:
+            stats.dump_stats(profile_out)
+            self.stdout.write(f"cProfile-Daten geschrieben: {profile_out}")
+
+    def _memory_pass(self, plugin, cfg, target_location, cassette, mode, top):
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        try:
+            res = _sync_parts(_iter_parts(plugin), cfg, target_location, None)
+        finally:
+            elapsed = time.perf_counter() - t0
+            snapshot = tracemalloc.take_snapshot()
+            _current, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            cassette.save()
+
+        self._summary(res, mode, cassette, elapsed, extra=f" peak_mem={peak / 1024:.0f} KiB")
+
+        self.stdout.write("--- tracemalloc (Zeilen mit den meisten Allokationen) ---")
+        for stat in snapshot.statistics("lineno")[:top]:
+            self.stdout.write(str(stat))
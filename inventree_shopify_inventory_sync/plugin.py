@@ -1,12 +1,12 @@
 # inventree_shopify_inventory_sync/plugin.py
 
 from plugin import InvenTreePlugin
-from plugin.mixins import SettingsMixin, UrlsMixin
+from plugin.mixins import AppMixin, ScheduleMixin, SettingsMixin, UrlsMixin
 from django.urls import path, reverse
 from . import views
 
 
-class ShopifyInventorySyncPlugin(SettingsMixin, UrlsMixin, InvenTreePlugin):
+class ShopifyInventorySyncPlugin(AppMixin, ScheduleMixin, SettingsMixin, UrlsMixin, InvenTreePlugin):
     """
     Shopify → InvenTree Bestandsabgleich (SKU == IPN)
     """
@@ -25,8 +25,24 @@ class ShopifyInventorySyncPlugin(SettingsMixin, UrlsMixin, InvenTreePlugin):
         path("config/", views.settings_form, name="config"),
         path("debug-sku/", views.debug_sku, name="debug-sku"),
         path("report-missing/", views.missing_report, name="report-missing"),
+        path("last-run/", views.last_run, name="last-run"),
+        path("plan/", views.plan, name="plan"),
+        path("plan/apply/", views.plan_apply, name="plan-apply"),
     ]
 
+    # läuft jede Minute, das eigentliche Intervall steuert `auto_schedule_minutes`
+    SCHEDULED_TASKS = {
+        "auto_sync": {
+            "func": "run_scheduled_sync",
+            "schedule": "I",
+            "minutes": 1,
+        },
+    }
+
+    def run_scheduled_sync(self):
+        from .shards import dispatch_sync
+        return dispatch_sync(self, scheduled=True)
+
     def get_menu_items(self, request):
         try:
             allowed = request.user.is_authenticated and (
@@ -46,6 +62,8 @@ class ShopifyInventorySyncPlugin(SettingsMixin, UrlsMixin, InvenTreePlugin):
             {"name": "Shopify Sync jetzt", "link": reverse(f"{ns}-sync-now"), "icon": "fa-sync"},
             {"name": "Debug SKU", "link": reverse(f"{ns}-debug-sku") + "?sku=MB-TEST", "icon": "fa-bug"},
             {"name": "Report fehlende SKUs", "link": reverse(f"{ns}-report-missing"), "icon": "fa-list"},
+            {"name": "Letzter Lauf", "link": reverse(f"{ns}-last-run"), "icon": "fa-history"},
+            {"name": "Diff-Vorschau (Plan)", "link": reverse(f"{ns}-plan"), "icon": "fa-list-alt"},
             {"name": "Ping", "link": reverse(f"{ns}-ping"), "icon": "fa-circle"},
         ]
 
@@ -84,7 +102,7 @@ class ShopifyInventorySyncPlugin(SettingsMixin, UrlsMixin, InvenTreePlugin):
         "auto_schedule_minutes": {
             "name": "Auto-Sync Intervall (Minuten)",
             "description": "0 = aus",
-            "default": 5,
+            "default": 0,
             "type": "integer",
         },
         "delta_guard": {
@@ -123,6 +141,42 @@ class ShopifyInventorySyncPlugin(SettingsMixin, UrlsMixin, InvenTreePlugin):
             "default": 40,
             "type": "integer",
         },
+        "run_deadline_s": {
+            "name": "Max. Laufzeit pro Lauf (s)",
+            "description": "Lauf stoppt danach sauber und setzt beim nächsten Lauf fort. 0 = aus",
+            "default": 300,
+            "type": "integer",
+        },
+        "breaker_threshold": {
+            "name": "Circuit-Breaker Schwelle",
+            "description": "Fehler in Folge, bis Shopify-Aufrufe sofort abgebrochen werden. 0 = aus",
+            "default": 5,
+            "type": "integer",
+        },
+        "breaker_cooldown_s": {
+            "name": "Circuit-Breaker Pause (s)",
+            "description": "Wartezeit bis zum nächsten Probe-Aufruf",
+            "default": 60,
+            "type": "integer",
+        },
+        "shard_count": {
+            "name": "Shards (Hintergrund-Tasks)",
+            "description": "Auto-Sync auf so viele Worker-Tasks aufteilen (pk-Bereiche). 1 = aus",
+            "default": 1,
+            "type": "integer",
+        },
+        "shared_rate_per_s": {
+            "name": "Shopify-Requests pro Sekunde (alle Shards)",
+            "description": "Gemeinsames Budget über den Cache (Redis empfohlen)",
+            "default": 2,
+            "type": "integer",
+        },
+        "plan_ttl_minutes": {
+            "name": "Plan gültig (Minuten)",
+            "description": "So lange kann eine Diff-Vorschau ohne erneuten Abruf gebucht werden",
+            "default": 30,
+            "type": "integer",
+        },
         # Anzeige-Felder (werden von views gepflegt)
         "last_sync_at": {
             "name": "Letzter Sync (Zeit)",
@@ -136,4 +190,34 @@ class ShopifyInventorySyncPlugin(SettingsMixin, UrlsMixin, InvenTreePlugin):
             "default": "",
             "type": "string",
         },
+        "state_breaker": {
+            "name": "Circuit-Breaker Zustand",
+            "description": "Intern (nur ohne geteilten Cache genutzt)",
+            "default": "",
+            "type": "string",
+        },
+        "state_auto_tick": {
+            "name": "Auto-Sync Intervall-Marke",
+            "description": "Intern (nur ohne geteilten Cache genutzt)",
+            "default": "",
+            "type": "string",
+        },
+        "state_active_run": {
+            "name": "Aktiver Lauf",
+            "description": "Intern (nur ohne geteilten Cache genutzt)",
+            "default": "",
+            "type": "string",
+        },
+        "state_shards": {
+            "name": "Shard-Bereiche und Fortsetzungspunkte",
+            "description": "Intern, bleibt bis alle Shards fertig sind",
+            "default": "",
+            "type": "string",
+        },
+        "resume_after_pk": {
+            "name": "Fortsetzen nach Teil-ID",
+            "description": "Wird vom Sync gepflegt (leer = von vorne)",
+            "default": "",
+            "type": "string",
+        },
     }
\ No newline at end of file
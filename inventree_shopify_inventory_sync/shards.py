@@ -0,0 +1,216 @@
+# inventree_shopify_inventory_sync/shards.py
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+from plugin.registry import registry
+
+from .state import SharedState, shared_cache
+from .sync import SLUG, _parts_queryset, record_run, run_full_sync, run_shard
+
+_CACHE_PREFIX = "shopify-inventory-sync"
+_RUN_TTL = 6 * 3600
+_LAST_RUN_TTL = 7 * 24 * 3600
+_SUM_KEYS = ("total_parts", "processed", "sku_matched", "changed", "skipped_delta_guard")
+
+
+def _key(*parts) -> str:
+    return ":".join([_CACHE_PREFIX, *[str(p) for p in parts]])
+
+
+class CacheRateBudget:
+    """Request-Budget pro Sekunde, über den Django-Cache von allen Shards gemeinsam genutzt."""
+
+    def __init__(self, key: str, per_second: int):
+        self.key = key
+        self.per_second = max(1, int(per_second or 1))
+
+    def acquire(self):
+        while True:
+            now = time.time()
+            window = int(now)
+            k = f"{self.key}:{window}"
+            cache.add(k, 0, timeout=5)
+            try:
+                used = cache.incr(k)
+            except ValueError:
+                # Schlüssel ist zwischen add() und incr() abgelaufen
+                continue
+            if used <= self.per_second:
+                return
+            time.sleep(max(0.0, window + 1 - now))
+
+
+def plan_shards(plugin, shard_count: int) -> list[list]:
+    """
+    Teilt die gefilterten Teile in bis zu `shard_count` gleich grosse, lückenlose pk-Bereiche
+    [lo, hi]; der erste und letzte Bereich sind offen (None), damit neue Teile immer erfasst werden.
+    """
+    pks = list(_parts_queryset(plugin).order_by("pk").values_list("pk", flat=True))
+    if not pks:
+        return []
+    shard_count = max(1, min(int(shard_count), len(pks)))
+    size = -(-len(pks) // shard_count)
+    starts = pks[::size]
+    return [
+        [None if i == 0 else lo, starts[i + 1] - 1 if i + 1 < len(starts) else None]
+        for i, lo in enumerate(starts)
+    ]
+
+
+def merge_results(results: list[dict]) -> dict:
+    merged = {
+        "ok": all(r.get("ok") for r in results),
+        "dry_run": any(r.get("dry_run") for r in results),
+        "shards": len(results),
+    }
+    for k in _SUM_KEYS:
+        merged[k] = sum(int(r.get(k) or 0) for r in results)
+
+    reasons = sorted({r["stopped_reason"] for r in results if r.get("stopped_reason")})
+    merged["stopped_reason"] = ",".join(reasons) or None
+
+    errors = [
+        {"shard": i, "error": r.get("error") or r.get("shopify_error")}
+        for i, r in enumerate(results) if r.get("error") or r.get("shopify_error")
+    ]
+    if errors:
+        merged["errors"] = errors
+
+    preview = []
+    for r in results:
+        preview.extend(r.get("details_preview") or [])
+    merged["details_preview"] = preview[:100]
+    return merged
+
+
+def get_last_run() -> dict | None:
+    return cache.get(_key("last_run"))
+
+
+def dispatch_sync(plugin, user=None, *, scheduled: bool = False) -> dict:
+    """
+    Startet einen Sync-Lauf. Bei `shard_count` > 1 wird der Teilebestand in pk-Bereiche
+    aufgeteilt und je Bereich ein Hintergrund-Task eingereiht; der letzte fertige Shard
+    führt die Ergebnisse zu einem Lauf-Eintrag zusammen.
+    Intervall, Lauf-Sperre und Shard-Bereiche liegen in SharedState (ohne geteilten Cache in der DB).
+    """
+    if scheduled and int(plugin.get_setting("auto_schedule_minutes") or 0) <= 0:
+        return {"ok": False, "error": "Auto-Sync deaktiviert."}
+
+    run_id = uuid.uuid4().hex
+    shard_count = int(plugin.get_setting("shard_count") or 1)
+
+    # Sperre läuft spätestens ab, wenn alle Shards nacheinander ihre Deadline erreicht hätten,
+    # damit ein abgestürzter Worker den Auto-Sync nicht stundenlang blockiert.
+    deadline_s = int(plugin.get_setting("run_deadline_s") or 0)
+    active_ttl = min(_RUN_TTL, deadline_s * max(1, shard_count) + 60) if deadline_s > 0 else _RUN_TTL
+    active = SharedState(plugin, "state_active_run")
+    if not active.add(run_id, active_ttl):
+        return {"ok": False, "error": "Vorheriger Lauf noch aktiv."}
+
+    if scheduled:
+        minutes = int(plugin.get_setting("auto_schedule_minutes") or 0)
+        if not SharedState(plugin, "state_auto_tick").add(time.time(), minutes * 60):
+            active.delete()
+            return {"ok": False, "error": "Intervall noch nicht erreicht."}
+
+    ranges = _shard_ranges(plugin, shard_count) if shard_count > 1 else []
+    if len(ranges) <= 1:
+        try:
+            res = run_full_sync(plugin, user)
+            record_run(plugin, res, user=user)
+            cache.set(_key("last_run"), res, _LAST_RUN_TTL)
+        finally:
+            active.delete()
+        return res
+
+    from InvenTree.tasks import offload_task
+
+    user_id = getattr(user, "pk", None)
+    cache.set(_key("run", run_id, "meta"), {"shards": len(ranges), "started_at": time.time()}, _RUN_TTL)
+    cache.set(_key("run", run_id, "done"), 0, _RUN_TTL)
+
+    # ohne geteilten Cache können Worker weder Budget noch Fortschritt teilen → im Prozess ausführen
+    force_sync = not shared_cache()
+    for idx, (lo, hi) in enumerate(ranges):
+        offload_task(run_shard_task, run_id, idx, lo, hi, user_id, force_sync=force_sync)
+
+    return {"ok": True, "run_id": run_id, "shards": len(ranges), "ranges": ranges}
+
+
+def _shard_ranges(plugin, shard_count: int) -> list[list]:
+    """
+    Solange ein Shard einen offenen Resume-Punkt hat, bleiben die Bereiche des
+    vorherigen Laufs bestehen; sonst werden sie neu aus den aktuellen Teilen berechnet.
+    """
+    state = SharedState(plugin, "state_shards")
+    cur = state.get() or {}
+    if cur.get("resume") and cur.get("ranges"):
+        return cur["ranges"]
+    ranges = plan_shards(plugin, shard_count)
+    state.set({"ranges": ranges, "resume": {}})
+    return ranges
+
+
+def run_shard_task(run_id: str, idx: int, lo: int | None, hi: int | None, user_id: int | None = None):
+    """Hintergrund-Task für einen Shard (wird über InvenTree.tasks.offload_task eingereiht)."""
+    plugin = registry.get_plugin(SLUG)
+    if plugin is None:
+        res = {"ok": False, "error": "plugin not loaded"}
+    else:
+        user = get_user_model().objects.filter(pk=user_id).first() if user_id else None
+        budget = CacheRateBudget(_key("budget"), int(plugin.get_setting("shared_rate_per_s") or 2))
+        # Resume-Punkt je Shard, damit `max_parts_per_run`/`run_deadline_s` den Bereich über Läufe abarbeiten
+        shard_state = SharedState(plugin, "state_shards")
+        after_pk = ((shard_state.get() or {}).get("resume") or {}).get(str(idx))
+        try:
+            res = run_shard(plugin, user, (lo, hi), rate_budget=budget, after_pk=after_pk)
+        except Exception as e:
+            res = {"ok": False, "error": f"{type(e).__name__}: {e}", "pk_range": [lo, hi]}
+
+        last_pk = res.pop("last_pk", None)
+        if res.get("ok") and not res.get("dry_run"):
+            resume_after = last_pk if res.get("stopped_reason") and last_pk else None
+
+            def _set_resume(cur):
+                cur = cur or {"ranges": [], "resume": {}}
+                resume = dict(cur.get("resume") or {})
+                if resume_after:
+                    resume[str(idx)] = resume_after
+                else:
+                    resume.pop(str(idx), None)
+                return {**cur, "resume": resume}
+
+            shard_state.update(_set_resume)
+            after_pk = resume_after
+        res["resume_after_pk"] = after_pk
+
+    cache.set(_key("run", run_id, "shard", idx), res, _RUN_TTL)
+    try:
+        done = cache.incr(_key("run", run_id, "done"))
+    except ValueError:
+        # Lauf-Eintrag abgelaufen
+        return
+
+    meta = cache.get(_key("run", run_id, "meta")) or {}
+    if plugin is not None and done == meta.get("shards"):
+        _finalize_run(plugin, run_id, meta)
+
+
+def _finalize_run(plugin, run_id: str, meta: dict):
+    results = []
+    for idx in range(meta["shards"]):
+        r = cache.get(_key("run", run_id, "shard", idx))
+        results.append(r if r is not None else {"ok": False, "error": "shard result missing"})
+
+    merged = merge_results(results)
+    merged["run_id"] = run_id
+    merged["duration_s"] = round(time.time() - meta.get("started_at", time.time()), 1)
+
+    record_run(plugin, merged)
+    cache.set(_key("last_run"), merged, _LAST_RUN_TTL)
+    cache.delete_many([_key("run", run_id, "shard", idx) for idx in range(meta["shards"])])
+    SharedState(plugin, "state_active_run").delete()
@@ -9,6 +9,18 @@ _API_BUCKET_HIGH_WATERMARK = 35
 _API_GENTLE_SLEEP = 0.6
 _API_MAX_BACKOFF = 5.0
 
+_BREAKER_THRESHOLD = 5
+_BREAKER_COOLDOWN = 60.0
+_BREAKER_REFRESH = 1.0
+
+
+class ShopifyCircuitOpen(requests.RequestException):
+    """Circuit-Breaker offen: Shopify gilt als gestört, Aufrufe werden sofort abgewiesen."""
+
+
+class ShopifyDeadlineExceeded(requests.RequestException):
+    """Die Laufzeit-Deadline des Sync-Laufs ist abgelaufen."""
+
 
 def _norm(s: str) -> str:
     if s is None:
@@ -17,7 +29,9 @@ def _norm(s: str) -> str:
 
 
 class ShopifyClient:
-    def __init__(self, domain: str, token: str, use_graphql: bool = False):
+    def __init__(self, domain: str, token: str, use_graphql: bool = False, *,
+                 breaker_threshold: int = _BREAKER_THRESHOLD, breaker_cooldown: float = _BREAKER_COOLDOWN,
+                 breaker_store=None, deadline: float | None = None, rate_budget=None, cassette=None):
         self.domain = domain.strip().lower().replace("https://", "").replace("http://", "").strip("/")
         self.token = token.strip()
         self.use_graphql = use_graphql
@@ -30,24 +44,120 @@ class ShopifyClient:
 
         self._locations_cache = None
 
+        # Circuit-Breaker: öffnet nach `breaker_threshold` Fehlern in Folge (0 = aus),
+        # nach `breaker_cooldown` Sekunden wird ein einzelner Probe-Aufruf zugelassen.
+        # `breaker_store` (optional, Methoden load()/opened()/closed()) teilt den Zustand mit
+        # anderen Läufen; geschrieben wird nur beim Öffnen und Schliessen.
+        self.breaker_threshold = max(0, int(breaker_threshold or 0))
+        self.breaker_cooldown = max(0.0, float(breaker_cooldown or 0))
+        self.breaker_store = breaker_store
+        self._consecutive_failures = 0
+        self._breaker_open_until = 0.0  # time.time(), über Prozesse vergleichbar
+        self._breaker_shared = False
+        self._breaker_loaded_at = None
+
+        # Deadline als time.monotonic()-Zeitpunkt (None = keine)
+        self.deadline = deadline
+
+        # optionales, mit anderen Workern geteiltes Request-Budget (Objekt mit acquire())
+        self.rate_budget = rate_budget
+
+        # optionale Cassette (siehe cassette.py) zum Aufzeichnen/Abspielen der Antworten
+        self.cassette = cassette
+
+    # ---------- circuit breaker / deadline ----------
+    @property
+    def breaker_open(self) -> bool:
+        return bool(self._breaker_open_until) and time.time() < self._breaker_open_until
+
+    def _load_breaker(self):
+        now = time.monotonic()
+        if self._breaker_loaded_at is not None and now - self._breaker_loaded_at < _BREAKER_REFRESH:
+            return
+        self._breaker_loaded_at = now
+        state = self.breaker_store.load() or {}
+        self._breaker_shared = bool(state)
+        if state:
+            self._breaker_open_until = max(self._breaker_open_until, float(state.get("open_until") or 0.0))
+            self._consecutive_failures = max(self._consecutive_failures, int(state.get("failures") or 0))
+
+    def _check_breaker(self, url: str):
+        if self.breaker_store is not None:
+            self._load_breaker()
+        if self.breaker_open:
+            raise ShopifyCircuitOpen(f"Circuit open, Shopify call skipped: {url}")
+
+    def _check_deadline(self, url: str):
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            raise ShopifyDeadlineExceeded(f"Run deadline exceeded: {url}")
+
+    def _record_success(self):
+        if self.breaker_store is not None and self._breaker_shared:
+            self.breaker_store.closed()
+            self._breaker_shared = False
+        self._consecutive_failures = 0
+        self._breaker_open_until = 0.0
+
+    def _record_failure(self, url: str):
+        self._consecutive_failures += 1
+        if self.breaker_threshold and self._consecutive_failures >= self.breaker_threshold:
+            # Zähler bleibt bis zum nächsten Erfolg stehen → ein fehlgeschlagener Probe öffnet sofort wieder
+            self._breaker_open_until = time.time() + self.breaker_cooldown
+            if self.breaker_store is not None:
+                self.breaker_store.opened(self._consecutive_failures, self._breaker_open_until)
+                self._breaker_shared = True
+            raise ShopifyCircuitOpen(
+                f"Circuit opened after {self._consecutive_failures} consecutive failures: {url}"
+            )
+
+    def _timeout(self, timeout: float) -> float:
+        # ein einzelner Versuch darf nicht über die Deadline hinaus warten
+        if self.deadline is None:
+            return timeout
+        return max(0.1, min(timeout, self.deadline - time.monotonic()))
+
+    def _sleep(self, seconds: float):
+        # beim Abspielen einer Cassette Wartezeiten mit deren Geschwindigkeit skalieren (0 = keine)
+        if self.cassette is not None and self.cassette.replaying:
+            if not self.cassette.speed:
+                return
+            seconds /= self.cassette.speed
+        if self.deadline is not None:
+            seconds = min(seconds, max(0.0, self.deadline - time.monotonic()))
+        if seconds > 0:
+            time.sleep(seconds)
+
     # ---------- rate-limit-aware request ----------
     def _request(self, method: str, url: str, *, params=None, json=None, timeout=20, max_retries=5) -> requests.Response:
+        self._check_breaker(url)
         backoff = 1.0
         last_exc = None
         for _ in range(max_retries):
+            self._check_deadline(url)
+            if self.rate_budget is not None:
+                self.rate_budget.acquire()
             try:
-                r = self.session.request(method=method.upper(), url=url, params=params, json=json, timeout=timeout)
+                if self.cassette is not None and self.cassette.replaying:
+                    r = self.cassette.play(method, url, params=params, body=json)
+                else:
+                    t0 = time.monotonic()
+                    r = self.session.request(
+                        method=method.upper(), url=url, params=params, json=json, timeout=self._timeout(timeout),
+                    )
+                    if self.cassette is not None:
+                        self.cassette.record(method, url, params, json, r, time.monotonic() - t0)
 
                 bucket = r.headers.get("X-Shopify-Shop-Api-Call-Limit")
                 if bucket:
                     try:
                         used, _cap = [int(x) for x in bucket.split("/", 1)]
                         if used >= _API_BUCKET_HIGH_WATERMARK:
-                            time.sleep(_API_GENTLE_SLEEP)
+                            self._sleep(_API_GENTLE_SLEEP)
                     except Exception:
                         pass
 
                 if 200 <= r.status_code < 300:
+                    self._record_success()
                     return r
 
                 if r.status_code == 429:
@@ -56,23 +166,27 @@ class ShopifyClient:
                         pause = float(ra)
                     except Exception:
                         pause = backoff
-                    time.sleep(min(pause, _API_MAX_BACKOFF))
+                    self._sleep(min(pause, _API_MAX_BACKOFF))
                     backoff = min(_API_MAX_BACKOFF, backoff * 2)
                     last_exc = requests.HTTPError(f"429 Too Many Requests: {url}", response=r)
                     continue
 
                 if 500 <= r.status_code < 600:
-                    time.sleep(min(backoff, _API_MAX_BACKOFF))
-                    backoff = min(_API_MAX_BACKOFF, backoff * 2)
                     last_exc = requests.HTTPError(f"{r.status_code} Server Error: {url}", response=r)
+                    self._record_failure(url)
+                    self._sleep(min(backoff, _API_MAX_BACKOFF))
+                    backoff = min(_API_MAX_BACKOFF, backoff * 2)
                     continue
 
+                # 4xx: Shopify ist erreichbar, zählt für den Breaker nicht als Störung
+                self._record_success()
                 r.raise_for_status()
                 return r
 
             except (requests.ConnectionError, requests.Timeout) as e:
                 last_exc = e
-                time.sleep(min(backoff, _API_MAX_BACKOFF))
+                self._record_failure(url)
+                self._sleep(min(backoff, _API_MAX_BACKOFF))
                 backoff = min(_API_MAX_BACKOFF, backoff * 2)
 
         if isinstance(last_exc, requests.HTTPError):
@@ -139,6 +253,8 @@ class ShopifyClient:
                             "product_id": v.get("product_id"),
                             "title": v.get("title"),
                         }
+        except (ShopifyCircuitOpen, ShopifyDeadlineExceeded):
+            raise
         except Exception:
             pass
 
@@ -0,0 +1,114 @@
+# inventree_shopify_inventory_sync/state.py
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+_CACHE_PREFIX = "shopify-inventory-sync:state"
+_LOCK_WAIT = 10.0
+
+
+def shared_cache() -> bool:
+    """True, wenn der Default-Cache zwischen Worker-Prozessen geteilt wird (z. B. Redis)."""
+    backend = ((getattr(settings, "CACHES", {}) or {}).get("default") or {}).get("BACKEND", "")
+    backend = backend.lower()
+    return bool(backend) and "locmem" not in backend and "dummy" not in backend
+
+
+class SharedState:
+    """
+    Kleiner JSON-Wert mit Ablaufzeit, den Web- und Worker-Prozesse gemeinsam sehen:
+    im Cache, wenn dieser geteilt ist, sonst in der Plugin-Einstellung `setting` (DB).
+    """
+
+    def __init__(self, plugin, setting: str):
+        self.plugin = plugin
+        self.setting = setting
+        self.use_cache = shared_cache()
+
+    @property
+    def _key(self) -> str:
+        return f"{_CACHE_PREFIX}:{self.setting}"
+
+    # ---------- DB-Fallback ----------
+    @staticmethod
+    def _decode(raw):
+        try:
+            data = json.loads(raw or "")
+        except (TypeError, ValueError):
+            return None
+        if not isinstance(data, dict):
+            return None
+        if data.get("exp") and data["exp"] < time.time():
+            return None
+        return data.get("v")
+
+    @staticmethod
+    def _encode(value, ttl) -> str:
+        if value is None:
+            return ""
+        return json.dumps({"v": value, "exp": time.time() + ttl if ttl else None})
+
+    def _locked_row(self):
+        from plugin.models import PluginSetting
+        config = self.plugin.plugin_config()
+        row, _ = PluginSetting.objects.get_or_create(plugin=config, key=self.setting, defaults={"value": ""})
+        return PluginSetting.objects.select_for_update().get(pk=row.pk)
+
+    # ---------- API ----------
+    def get(self):
+        if self.use_cache:
+            return cache.get(self._key)
+        return self._decode(self.plugin.get_setting(self.setting))
+
+    def set(self, value, ttl: float | None = None):
+        if self.use_cache:
+            cache.set(self._key, value, ttl)
+        else:
+            self.plugin.set_setting(self.setting, self._encode(value, ttl))
+
+    def delete(self):
+        if self.use_cache:
+            cache.delete(self._key)
+        else:
+            self.plugin.set_setting(self.setting, "")
+
+    def add(self, value, ttl: float | None = None) -> bool:
+        """Setzt den Wert nur, wenn keiner (mehr) gesetzt ist. Atomar, taugt als Sperre."""
+        if self.use_cache:
+            return cache.add(self._key, value, ttl)
+        with transaction.atomic():
+            row = self._locked_row()
+            if self._decode(row.value) is not None:
+                return False
+            row.value = self._encode(value, ttl)
+            row.save()
+            return True
+
+    def update(self, fn, ttl: float | None = None):
+        """Read-modify-write unter Sperre; `fn(alter Wert)` liefert den neuen Wert (None = löschen)."""
+        if not self.use_cache:
+            with transaction.atomic():
+                row = self._locked_row()
+                value = fn(self._decode(row.value))
+                row.value = self._encode(value, ttl)
+                row.save()
+                return value
+
+        lock = f"{self._key}:lock"
+        until = time.monotonic() + _LOCK_WAIT
+        while not cache.add(lock, 1, timeout=int(_LOCK_WAIT)):
+            if time.monotonic() >= until:
+                break
+            time.sleep(0.05)
+        try:
+            value = fn(cache.get(self._key))
+            if value is None:
+                cache.delete(self._key)
+            else:
+                cache.set(self._key, value, ttl)
+            return value
+        finally:
+            cache.delete(lock)
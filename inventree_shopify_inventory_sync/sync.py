@@ -1,13 +1,43 @@
 # inventree_shopify_inventory_sync/sync.py
 import time
+import uuid
 from typing import Iterable
 
+import requests
+from django.core.cache import cache
 from django.db import transaction
 
 from part.models import Part, PartCategory
 from stock.models import StockItem, StockLocation
 
-from .shopify_client import ShopifyClient
+from .plan import (
+    SyncPlan, ST_ADJUST, ST_ADJUSTED, ST_INVENTORY_ERROR, ST_NO_CHANGE, ST_NOT_FOUND, ST_SKIPPED_GUARD, ST_STALE,
+)
+from .shopify_client import ShopifyClient, ShopifyCircuitOpen, ShopifyDeadlineExceeded
+from .state import SharedState, shared_cache
+
+
+_BREAKER_TTL = 24 * 3600
+_CHECKPOINT_S = 10.0
+_PLAN_STALE_S = 120.0
+SLUG = "shopify-inventory-sync"
+
+
+class BreakerStore:
+    """Teilt den Circuit-Breaker-Zustand zwischen Läufen, Shards und Prozessen."""
+
+    def __init__(self, plugin):
+        self.state = SharedState(plugin, "state_breaker")
+
+    def load(self) -> dict | None:
+        return self.state.get()
+
+    def opened(self, failures: int, open_until: float):
+        self.state.set({"failures": failures, "open_until": open_until}, _BREAKER_TTL)
+
+    def closed(self):
+        # nur einen abgelaufenen Breaker löschen, nicht einen, den ein anderer Lauf gerade geöffnet hat
+        self.state.update(lambda cur: cur if cur and cur.get("open_until", 0) > time.time() else None, _BREAKER_TTL)
 
 
 def _as_bool(val) -> bool:
@@ -31,19 +61,28 @@ def _ensure_target_location(loc_id: str | int) -> StockLocation | None:
     return loc
 
 
-def _get_or_create_mirror_item(part: Part, location: StockLocation) -> StockItem:
-    item = (
+def _get_or_create_mirror_item(part_id: int, location: StockLocation, lock: bool = False) -> StockItem:
+    qs = StockItem.objects.filter(part_id=part_id, location=location, is_building=False)
+    if lock:
+        qs = qs.select_for_update()
+    item = qs.order_by("id").first()
+    if item:
+        return item
+    return StockItem.objects.create(part_id=part_id, location=location, quantity=0)
+
+
+def _mirror_quantity(part_id: int, location: StockLocation) -> int:
+    qty = (
         StockItem.objects
-        .filter(part=part, location=location, is_building=False)
+        .filter(part_id=part_id, location=location, is_building=False)
         .order_by("id")
+        .values_list("quantity", flat=True)
         .first()
     )
-    if item:
-        return item
-    return StockItem.objects.create(part=part, location=location, quantity=0)
+    return int(qty or 0)
 
 
-def _iter_parts(plugin) -> Iterable[Part]:
+def _parts_queryset(plugin):
     qs = Part.objects.filter(active=True)
 
     cat_ids_str = (plugin.get_setting("filter_category_ids") or "").strip()
@@ -61,96 +100,466 @@ def _iter_parts(plugin) -> Iterable[Part]:
             if all_ids:
                 qs = qs.filter(category_id__in=all_ids)
 
-    return qs.iterator()
+    return qs
 
 
-def run_full_sync(plugin, user):
-    domain = plugin.get_setting("shop_domain")
-    token = plugin.get_setting("admin_api_token")
-    use_graphql = _as_bool(plugin.get_setting("use_graphql"))
-    loc_id = plugin.get_setting("inv_target_location")
-    dry_run = _as_bool(plugin.get_setting("dry_run"))
-    delta_guard = int(plugin.get_setting("delta_guard") or 0)
-    note = plugin.get_setting("note_text") or "Korrektur durch Onlineshop"
-    only_loc_name = (plugin.get_setting("restrict_location_name") or "").strip() or None
-
-    throttle_ms = int(plugin.get_setting("throttle_ms") or 0)
-    max_parts = int(plugin.get_setting("max_parts_per_run") or 0)
-
-    if not domain or not token or not loc_id:
-        return {"ok": False, "error": "Einstellungen unvollständig (Domain/Token/Ziel-Lagerort)."}
-
-    target_location = _ensure_target_location(loc_id)
+def _iter_parts(plugin, after_pk: int | None = None, pk_range: tuple | None = None) -> Iterable[Part]:
+    qs = _parts_queryset(plugin)
+    if after_pk:
+        qs = qs.filter(pk__gt=after_pk)
+    if pk_range:
+        # None als Grenze = offen, damit neue Teile immer in einem Bereich landen
+        lo, hi = pk_range
+        if lo is not None:
+            qs = qs.filter(pk__gte=lo)
+        if hi is not None:
+            qs = qs.filter(pk__lte=hi)
+
+    # feste Reihenfolge, damit ein abgebrochener Lauf per Teil-ID fortgesetzt werden kann
+    return qs.order_by("pk").iterator()
+
+
+def _resume_point(plugin) -> int | None:
+    val = str(plugin.get_setting("resume_after_pk") or "").strip()
+    return int(val) if val.isdigit() else None
+
+
+def _load_config(plugin) -> dict:
+    return {
+        "domain": plugin.get_setting("shop_domain"),
+        "token": plugin.get_setting("admin_api_token"),
+        "use_graphql": _as_bool(plugin.get_setting("use_graphql")),
+        "loc_id": plugin.get_setting("inv_target_location"),
+        "dry_run": _as_bool(plugin.get_setting("dry_run")),
+        "delta_guard": int(plugin.get_setting("delta_guard") or 0),
+        "note": plugin.get_setting("note_text") or "Korrektur durch Onlineshop",
+        "only_loc_name": (plugin.get_setting("restrict_location_name") or "").strip() or None,
+        "throttle_ms": int(plugin.get_setting("throttle_ms") or 0),
+        "max_parts": int(plugin.get_setting("max_parts_per_run") or 0),
+        "deadline_s": int(plugin.get_setting("run_deadline_s") or 0),
+        "breaker_threshold": int(plugin.get_setting("breaker_threshold") or 0),
+        "breaker_cooldown": int(plugin.get_setting("breaker_cooldown_s") or 0),
+    }
+
+
+def _prepare(plugin, **overrides):
+    """
+    Liest die Einstellungen und prüft sie. Liefert (cfg, target_location, error).
+    `overrides` ersetzen einzelne Werte, z. B. dry_run oder cassette für Profiling-Läufe.
+    """
+    cfg = _load_config(plugin)
+    cfg.update(overrides)
+    # Breaker-Zustand wird über Läufe hinweg geteilt (nicht bei Cassette-Läufen)
+    if cfg.get("cassette") is None:
+        cfg.setdefault("breaker_store", BreakerStore(plugin))
+    if not cfg["domain"] or not cfg["token"] or not cfg["loc_id"]:
+        return cfg, None, "Einstellungen unvollständig (Domain/Token/Ziel-Lagerort)."
+
+    target_location = _ensure_target_location(cfg["loc_id"])
     if not target_location:
-        return {"ok": False, "error": "Ziel-Lagerort ungültig (strukturell oder nicht gefunden)."}
+        return cfg, None, "Ziel-Lagerort ungültig (strukturell oder nicht gefunden)."
 
-    client = ShopifyClient(domain, token, use_graphql=use_graphql)
+    return cfg, target_location, None
 
-    total_parts = 0
-    matched = 0
-    changed = 0
-    skipped_guard = 0
-    preview = []
 
+def _fetch_plan(parts: Iterable[Part], cfg: dict, target_location: StockLocation,
+                rate_budget=None, start_pk: int | None = None, plan: SyncPlan | None = None,
+                checkpoint=None) -> dict:
+    """
+    Fetch-Stufe: liest Shopify- und InvenTree-Bestände in einen kompakten SyncPlan
+    (oder hängt sie an `plan` an). `checkpoint(progress)` wird alle paar Sekunden
+    mit dem Zwischenstand aufgerufen.
+    """
+    only_loc_name = cfg["only_loc_name"]
+    throttle_ms = cfg["throttle_ms"]
+    max_parts = cfg["max_parts"]
+
+    deadline = time.monotonic() + cfg["deadline_s"] if cfg["deadline_s"] > 0 else None
+    client = ShopifyClient(
+        cfg["domain"], cfg["token"], use_graphql=cfg["use_graphql"],
+        breaker_threshold=cfg["breaker_threshold"], breaker_cooldown=cfg["breaker_cooldown"],
+        breaker_store=cfg.get("breaker_store"),
+        deadline=deadline, rate_budget=rate_budget, cassette=cfg.get("cassette"),
+    )
+
+    plan = plan if plan is not None else SyncPlan()
+    last_checkpoint = time.monotonic()
+    total_parts = 0
     processed = 0
-    for part in _iter_parts(plugin):
+    stopped_reason = None
+    error = None
+    last_pk = start_pk
+    for part in parts:
         total_parts += 1
         if max_parts and processed >= max_parts:
+            stopped_reason = "max_parts"
+            break
+        if deadline is not None and time.monotonic() >= deadline:
+            stopped_reason = "deadline"
             break
 
         ipn = (part.IPN or "").strip()
         if not ipn:
+            last_pk = part.pk
             continue
 
-        variant = client.find_variant_by_sku(ipn)
+        try:
+            variant = client.find_variant_by_sku(ipn)
+            target = None
+            if variant:
+                inv_item_id = variant.get("inventory_item_id") or variant.get("inventoryItemId")
+                target = client.inventory_available_sum(inv_item_id, only_location_name=only_loc_name)
+        except ShopifyCircuitOpen:
+            stopped_reason = "circuit_open"
+            break
+        except ShopifyDeadlineExceeded:
+            stopped_reason = "deadline"
+            break
+        except requests.RequestException as e:
+            # bisher gelesene Teile werden trotzdem gebucht, der nächste Lauf setzt hier fort
+            stopped_reason = "shopify_error"
+            error = f"{type(e).__name__}: {e}"
+            break
+
         if not variant:
-            preview.append({"part": part.pk, "ipn": ipn, "status": "shopify_variant_not_found"})
+            plan.add(part.pk, ST_NOT_FOUND)
+        elif target is None:
+            plan.add(part.pk, ST_INVENTORY_ERROR, inventory_item_id=inv_item_id)
         else:
-            matched += 1
-            inv_item_id = variant.get("inventory_item_id") or variant.get("inventoryItemId")
-            target = client.inventory_available_sum(inv_item_id, only_location_name=only_loc_name)
-            if target is None:
-                preview.append({"part": part.pk, "ipn": ipn, "status": "shopify_inventory_error"})
-            else:
-                mirror = _get_or_create_mirror_item(part, target_location)
-                current = int(mirror.quantity or 0)
-                delta = int(target) - current
-
-                if delta_guard and abs(delta) > delta_guard:
-                    skipped_guard += 1
-                    preview.append({
-                        "part": part.pk, "ipn": ipn, "current": current, "target": int(target),
-                        "delta": delta, "status": "skipped_delta_guard"
-                    })
-                elif dry_run or delta == 0:
-                    preview.append({
-                        "part": part.pk, "ipn": ipn, "current": current, "target": int(target),
-                        "delta": delta, "status": "dry_run" if dry_run else "no_change"
-                    })
-                else:
-                    with transaction.atomic():
-                        try:
-                            mirror.adjustStock(delta, user=user, notes=note)  # type: ignore[attr-defined]
-                        except Exception:
-                            mirror.quantity = int(target)
-                            mirror.save()
-                    changed += 1
-                    preview.append({
-                        "part": part.pk, "ipn": ipn, "current": current, "target": int(target),
-                        "delta": delta, "status": "adjusted"
-                    })
+            plan.add(
+                part.pk, inventory_item_id=inv_item_id,
+                current=_mirror_quantity(part.pk, target_location), target=int(target),
+            )
 
         processed += 1
+        last_pk = part.pk
+        if checkpoint is not None and time.monotonic() - last_checkpoint >= _CHECKPOINT_S:
+            checkpoint({"plan": plan, "total_parts": total_parts, "processed": processed, "last_pk": last_pk})
+            last_checkpoint = time.monotonic()
         if throttle_ms > 0:
             time.sleep(throttle_ms / 1000.0)
 
     return {
-        "ok": True,
-        "dry_run": dry_run,
+        "plan": plan,
         "total_parts": total_parts,
         "processed": processed,
-        "sku_matched": matched,
+        "stopped_reason": stopped_reason,
+        "error": error,
+        "last_pk": last_pk,
+    }
+
+
+def _commit_plan(plan: SyncPlan, target_location: StockLocation, user, note: str,
+                 delta_guard: int = 0, check_current: bool = False) -> int:
+    """
+    Commit-Stufe: bucht alle Zeilen mit Status ST_ADJUST.
+    Das Delta wird gegen die gesperrte Spiegel-Position neu berechnet, da sich der
+    InvenTree-Bestand seit dem Fetch geändert haben kann. Mit `check_current` werden
+    solche Zeilen stattdessen abgelehnt (ST_STALE).
+    """
+    changed = 0
+    for i in plan.indices(ST_ADJUST):
+        with transaction.atomic():
+            mirror = _get_or_create_mirror_item(plan.part_id[i], target_location, lock=True)
+            current = int(mirror.quantity or 0)
+            if check_current and current != plan.current[i]:
+                plan.status[i] = ST_STALE
+                continue
+
+            delta = plan.target[i] - current
+            plan.current[i] = current
+            plan.delta[i] = delta
+            if delta == 0:
+                plan.status[i] = ST_NO_CHANGE
+                continue
+            if delta_guard and abs(delta) > delta_guard:
+                plan.status[i] = ST_SKIPPED_GUARD
+                continue
+
+            try:
+                mirror.adjustStock(delta, user=user, notes=note)  # type: ignore[attr-defined]
+            except Exception:
+                mirror.quantity = plan.target[i]
+                mirror.save()
+        plan.status[i] = ST_ADJUSTED
+        changed += 1
+    return changed
+
+
+def _plan_preview(plan: SyncPlan, start: int = 0, stop: int = 100) -> list[dict]:
+    rows = [plan.row(i) for i in range(start, min(stop, len(plan)))]
+    ipns = dict(Part.objects.filter(pk__in=[r["part"] for r in rows]).values_list("pk", "IPN"))
+    return [{"part": r["part"], "ipn": (ipns.get(r["part"]) or "").strip(), **r} for r in rows]
+
+
+def _sync_parts(parts: Iterable[Part], cfg: dict, target_location: StockLocation, user,
+                rate_budget=None, start_pk: int | None = None) -> dict:
+    fetched = _fetch_plan(parts, cfg, target_location, rate_budget=rate_budget, start_pk=start_pk)
+    plan = fetched["plan"]
+    plan.compute(delta_guard=cfg["delta_guard"], dry_run=cfg["dry_run"])
+    changed = _commit_plan(plan, target_location, user, cfg["note"], delta_guard=cfg["delta_guard"])
+
+    res = {
+        "ok": True,
+        "dry_run": cfg["dry_run"],
+        "total_parts": fetched["total_parts"],
+        "processed": fetched["processed"],
+        "sku_matched": len(plan) - plan.count(ST_NOT_FOUND),
+        "changed": changed,
+        "skipped_delta_guard": plan.count(ST_SKIPPED_GUARD),
+        "stopped_reason": fetched["stopped_reason"],
+        "last_pk": fetched["last_pk"],
+        "details_preview": _plan_preview(plan),
+    }
+    if fetched["error"]:
+        res["shopify_error"] = fetched["error"]
+    return res
+
+
+def run_full_sync(plugin, user):
+    cfg, target_location, error = _prepare(plugin)
+    if error:
+        return {"ok": False, "error": error}
+
+    resume_from = _resume_point(plugin)
+    res = _sync_parts(_iter_parts(plugin, after_pk=resume_from), cfg, target_location, user, start_pk=resume_from)
+
+    # Resume-Punkt: bei vorzeitigem Abbruch nach dem letzten fertigen Teil weitermachen,
+    # nach einem vollständigen Durchlauf wieder von vorne beginnen.
+    # Dry-Runs verschieben den Resume-Punkt nicht, sonst überspringt der nächste echte Lauf
+    # alle nur angezeigten Teile.
+    last_pk = res.pop("last_pk")
+    resume_after = last_pk if res["stopped_reason"] else None
+    if not cfg["dry_run"]:
+        plugin.set_setting("resume_after_pk", str(resume_after or ""), user=user)
+
+    res["resume_after_pk"] = resume_after
+    return res
+
+
+def run_shard(plugin, user, pk_range: tuple, rate_budget=None, after_pk: int | None = None) -> dict:
+    """
+    Synchronisiert nur die Teile im pk-Bereich `pk_range` (inklusive), ab `after_pk`.
+    Den Resume-Punkt (`last_pk` im Ergebnis) verwaltet der Aufrufer.
+    """
+    cfg, target_location, error = _prepare(plugin)
+    if error:
+        return {"ok": False, "error": error}
+
+    parts = _iter_parts(plugin, after_pk=after_pk, pk_range=pk_range)
+    res = _sync_parts(parts, cfg, target_location, user, rate_budget=rate_budget, start_pk=after_pk)
+    res["pk_range"] = list(pk_range)
+    return res
+
+
+def _plan_key(plan_id: str) -> str:
+    return f"shopify-inventory-sync:plan:{plan_id}"
+
+
+def _plan_ttl(plugin) -> int:
+    return max(1, int(plugin.get_setting("plan_ttl_minutes") or 30)) * 60
+
+
+def _plan_storage_error() -> str | None:
+    # Pläne und Apply-Sperre liegen im Cache; ein prozesslokaler Cache (LocMem) reicht dafür nicht
+    if not shared_cache():
+        return "Diff-Vorschau benötigt einen geteilten Cache (z. B. Redis)."
+    return None
+
+
+def start_plan(plugin, continue_id: str | None = None) -> dict:
+    """
+    Reiht die Berechnung des vollständigen Diffs (ohne Buchungen) als Hintergrund-Task ein
+    und liefert die Plan-ID zum Abfragen. `max_parts_per_run` gilt nicht; bricht der Abruf an
+    Deadline, Breaker oder einem Worker-Abbruch ab, setzt `continue_id` den Plan nach dem
+    letzten gespeicherten Teil fort.
+    """
+    error = _plan_storage_error()
+    if error:
+        return {"ok": False, "error": error}
+    cfg, target_location, error = _prepare(plugin, max_parts=0)
+    if error:
+        return {"ok": False, "error": error}
+
+    ttl_s = _plan_ttl(plugin)
+    now = time.time()
+    if continue_id:
+        entry = cache.get(_plan_key(continue_id))
+        if entry is None:
+            return {"ok": False, "error": "Plan nicht gefunden oder abgelaufen."}
+        if entry["status"] in ("pending", "running") and now - entry["updated_at"] < _PLAN_STALE_S:
+            return {"ok": False, "error": "Plan wird gerade berechnet."}
+        if entry["status"] == "ready" and not entry["stopped_reason"]:
+            return {"ok": False, "error": "Plan ist bereits vollständig."}
+        if entry["location_id"] != target_location.pk:
+            return {"ok": False, "error": "Ziel-Lagerort hat sich seit dem Plan geändert."}
+    else:
+        entry = {
+            "id": uuid.uuid4().hex, "created_at": now, "location_id": target_location.pk,
+            "total_parts": 0, "processed": 0, "stopped_reason": None, "last_pk": None,
+            "columns": SyncPlan().dumps(),
+        }
+
+    entry.update({"status": "pending", "error": None, "updated_at": now, "expires_at": now + ttl_s})
+    cache.set(_plan_key(entry["id"]), entry, ttl_s)
+    cache.set(_plan_key("last"), entry["id"], ttl_s)
+
+    from InvenTree.tasks import offload_task
+    offload_task(build_plan_task, entry["id"])
+    return {"ok": True, "plan_id": entry["id"], "status": "pending"}
+
+
+def build_plan_task(plan_id: str):
+    """Hintergrund-Task: berechnet den Plan und speichert den Zwischenstand laufend im Cache."""
+    from plugin.registry import registry
+
+    plugin = registry.get_plugin(SLUG)
+    key = _plan_key(plan_id)
+    entry = cache.get(key)
+    if plugin is None or entry is None:
+        return
+
+    ttl_s = _plan_ttl(plugin)
+    base_total, base_processed = entry["total_parts"], entry["processed"]
+
+    def save(status, progress, stopped_reason=None, error=None):
+        plan = progress["plan"]
+        plan.compute(delta_guard=cfg["delta_guard"], dry_run=False)
+        now = time.time()
+        entry.update({
+            "status": status,
+            "error": error,
+            "updated_at": now,
+            "expires_at": now + ttl_s,
+            "total_parts": base_total + progress["total_parts"],
+            "processed": base_processed + progress["processed"],
+            "stopped_reason": stopped_reason,
+            "last_pk": progress["last_pk"],
+            "columns": plan.dumps(),
+        })
+        cache.set(key, entry, ttl_s)
+
+    cfg, target_location, error = _prepare(plugin, max_parts=0)
+    plan = SyncPlan.loads(entry["columns"])
+    start = {"plan": plan, "total_parts": 0, "processed": 0, "last_pk": entry["last_pk"]}
+    if error:
+        save("failed", start, stopped_reason="error", error=error)
+        return
+
+    save("running", start, stopped_reason="running")
+    progress = dict(start)
+
+    def checkpoint(p):
+        progress.update(p)
+        save("running", p, stopped_reason="running")
+
+    try:
+        fetched = _fetch_plan(
+            _iter_parts(plugin, after_pk=entry["last_pk"]), cfg, target_location,
+            start_pk=entry["last_pk"], plan=plan, checkpoint=checkpoint,
+        )
+    except Exception as e:
+        # Zwischenstand des letzten Checkpoints bleibt erhalten und kann fortgesetzt werden
+        save("failed", progress, stopped_reason="error", error=f"{type(e).__name__}: {e}")
+        return
+
+    save("ready", fetched, stopped_reason=fetched["stopped_reason"], error=fetched["error"])
+
+
+def _plan_info(entry: dict, plan: SyncPlan) -> dict:
+    return {
+        "plan_id": entry["id"],
+        "status": entry["status"],
+        "error": entry.get("error"),
+        "created_at": entry["created_at"],
+        "expires_at": entry["expires_at"],
+        "total_parts": entry["total_parts"],
+        "processed": entry["processed"],
+        "stopped_reason": entry["stopped_reason"],
+        "complete": entry["status"] == "ready" and not entry["stopped_reason"],
+        "rows": len(plan),
+        "summary": plan.summary(),
+    }
+
+
+def get_last_plan_id() -> str | None:
+    return cache.get(_plan_key("last"))
+
+
+def get_plan_page(plan_id: str, page: int = 1, page_size: int = 50) -> dict:
+    error = _plan_storage_error()
+    if error:
+        return {"ok": False, "error": error}
+    entry = cache.get(_plan_key(plan_id))
+    if entry is None:
+        return {"ok": False, "error": "Plan nicht gefunden oder abgelaufen."}
+
+    plan = SyncPlan.loads(entry["columns"])
+    page = max(1, page)
+    page_size = max(1, min(page_size, 500))
+    start = (page - 1) * page_size
+    return {
+        "ok": True,
+        **_plan_info(entry, plan),
+        "page": page,
+        "page_size": page_size,
+        "pages": max(1, -(-len(plan) // page_size)),
+        "details": _plan_preview(plan, start, start + page_size),
+    }
+
+
+def apply_plan(plugin, user, plan_id: str) -> dict:
+    """Bucht genau den gespeicherten Diff; Shopify wird dabei nicht erneut abgefragt."""
+    error = _plan_storage_error()
+    if error:
+        return {"ok": False, "error": error}
+
+    key = _plan_key(plan_id)
+    # Sperre gegen doppeltes Anwenden desselben Plans
+    if not cache.add(f"{key}:apply", True, timeout=3600):
+        return {"ok": False, "error": "Plan wird bereits angewendet."}
+
+    entry = cache.get(key)
+    cfg, target_location, error = _prepare(plugin)
+    if entry is None:
+        error = "Plan nicht gefunden oder abgelaufen."
+    elif entry["status"] != "ready":
+        error = f"Plan ist nicht bereit (Status: {entry['status']})."
+    elif not error and target_location.pk != entry["location_id"]:
+        error = "Ziel-Lagerort hat sich seit dem Plan geändert."
+    if error:
+        cache.delete(f"{key}:apply")
+        return {"ok": False, "error": error}
+
+    plan = SyncPlan.loads(entry["columns"])
+    try:
+        changed = _commit_plan(
+            plan, target_location, user, cfg["note"], delta_guard=cfg["delta_guard"], check_current=True,
+        )
+    finally:
+        # auch ein teilweise angewendeter Plan darf nicht erneut gebucht werden
+        cache.delete_many([key, f"{key}:apply"])
+
+    return {
+        "ok": True,
+        "plan_id": plan_id,
         "changed": changed,
-        "skipped_delta_guard": skipped_guard,
-        "details_preview": preview[:100],
-    }
\ No newline at end of file
+        "rejected_stale": plan.count(ST_STALE),
+        "summary": plan.summary(),
+        "details_preview": _plan_preview(plan),
+    }
+
+
+def record_run(plugin, res: dict, user=None):
+    """Schreibt Zeitpunkt und Kurzinfo eines Laufs in die Anzeige-Felder."""
+    from datetime import datetime
+    plugin.set_setting("last_sync_at", datetime.now().strftime("%Y-%m-%d %H:%M:%S"), user=user)
+    if res.get("plan_id"):
+        short = f"ok={res.get('ok')} plan={res.get('plan_id')} changed={res.get('changed')} rejected_stale={res.get('rejected_stale')}"
+    else:
+        short = f"ok={res.get('ok')} matched={res.get('sku_matched')} changed={res.get('changed')} processed={res.get('processed')}"
+    if res.get("shards"):
+        short += f" shards={res.get('shards')}"
+    if res.get("stopped_reason"):
+        short += f" stopped={res.get('stopped_reason')}"
+    plugin.set_setting("last_sync_result", short, user=user)
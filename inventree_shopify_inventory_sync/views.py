@@ -3,12 +3,15 @@
 from django.http import JsonResponse, HttpResponseForbidden, HttpResponse
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from django.middleware.csrf import get_token
 from django.utils.html import escape
 from django.shortcuts import redirect
 
 from plugin.registry import registry
-from .sync import run_full_sync, _iter_parts
+from .sync import run_full_sync, record_run, start_plan, get_last_plan_id, get_plan_page, apply_plan, _iter_parts
 from .shopify_client import ShopifyClient
+from .shards import get_last_run
 
 SLUG = "shopify-inventory-sync"
 
@@ -50,6 +53,9 @@ def index(request):
             "config": f"{base}/config/",
             "debug_sku": f"{base}/debug-sku/?sku=MB-TEST",
             "report_missing": f"{base}/report-missing/",
+            "last_run": f"{base}/last-run/",
+            "plan": f"{base}/plan/",
+            "plan_apply": f"{base}/plan/apply/",
         },
         "perms_ok": _allowed(request.user),
     }
@@ -89,9 +95,10 @@ def settings_form(request):
         "shop_domain", "admin_api_token", "use_graphql", "inv_target_location",
         "restrict_location_name", "auto_schedule_minutes", "delta_guard",
         "dry_run", "note_text", "filter_category_ids", "throttle_ms",
-        "max_parts_per_run",
+        "max_parts_per_run", "run_deadline_s", "breaker_threshold", "breaker_cooldown_s",
+        "shard_count", "shared_rate_per_s", "plan_ttl_minutes",
     ]
-    info_keys = ["last_sync_at", "last_sync_result"]
+    info_keys = ["last_sync_at", "last_sync_result", "resume_after_pk"]
 
     saved_msg = ""
     sync_result = None
@@ -100,17 +107,16 @@ def settings_form(request):
         if "__run_sync__" in request.POST:
             res = run_full_sync(p, request.user)
             sync_result = res
-            from datetime import datetime
-            p.set_setting("last_sync_at", datetime.now().strftime("%Y-%m-%d %H:%M:%S"), user=request.user)
-            short = f"ok={res.get('ok')} matched={res.get('sku_matched')} changed={res.get('changed')} processed={res.get('processed')}"
-            p.set_setting("last_sync_result", short, user=request.user)
+            record_run(p, res, user=request.user)
             saved_msg = "Sync ausgeführt."
         else:
             for k in keys:
                 val = request.POST.get(k, "")
                 if k in {"use_graphql", "dry_run"}:
                     val = str(val).lower() in {"1", "true", "on", "yes"}
-                elif k in {"auto_schedule_minutes", "delta_guard", "throttle_ms", "max_parts_per_run"}:
+                elif k in {"auto_schedule_minutes", "delta_guard", "throttle_ms", "max_parts_per_run",
+                           "run_deadline_s", "breaker_threshold", "breaker_cooldown_s",
+                           "shard_count", "shared_rate_per_s", "plan_ttl_minutes"}:
                     try:
                         val = int(val)
                     except Exception:
@@ -161,6 +167,11 @@ def settings_form(request):
     html.append(f"<form method='post' style='display:inline'><button class='btn primary' name='__run_sync__' value='1'>Sync jetzt starten</button></form>")
     html.append(f"<a class='btn' href='{escape(base)}/../sync-now-open/'>als JSON öffnen</a>")
     html.append(f"<a class='btn' href='{escape(base)}/../report-missing/'>fehlende SKUs</a>")
+    html.append(
+        f"<form method='post' action='{escape(base)}/../plan/' style='display:inline'>"
+        f"<input type='hidden' name='csrfmiddlewaretoken' value='{escape(get_token(request))}'>"
+        f"<button class='btn'>Diff-Vorschau (Plan) berechnen</button></form>"
+    )
     html.append("</div>")
 
     if saved_msg:
@@ -168,10 +179,12 @@ def settings_form(request):
 
     last_at = infos.get("last_sync_at") or "—"
     last_res = infos.get("last_sync_result") or "—"
+    resume = infos.get("resume_after_pk") or "—"
     html += [
         "<div class='hr'></div>",
         "<div class='kv'><dt>Letzter Sync</dt><dd>" + escape(last_at) + "</dd></div>",
         "<div class='kv'><dt>Ergebnis</dt><dd>" + escape(last_res) + "</dd></div>",
+        "<div class='kv'><dt>Fortsetzen nach Teil</dt><dd>" + escape(resume) + "</dd></div>",
     ]
     if sync_result is not None:
         import json
@@ -186,13 +199,19 @@ def settings_form(request):
     html.append(input_row("GraphQL verwenden (true/false)", "use_graphql", values.get("use_graphql", True), "text", "True/False"))
     html.append(input_row("InvenTree Ziel-Lagerort (ID)", "inv_target_location", values.get("inv_target_location", ""), "text", "z. B. 143"))
     html.append(input_row("Nur Standort (Name)", "restrict_location_name", values.get("restrict_location_name", ""), "text", "Domleschgerstrasse 22"))
-    html.append(input_row("Auto-Sync Intervall Minuten", "auto_schedule_minutes", values.get("auto_schedule_minutes", 5), "number"))
+    html.append(input_row("Auto-Sync Intervall Minuten", "auto_schedule_minutes", values.get("auto_schedule_minutes", 0), "number"))
     html.append(input_row("Delta-Guard", "delta_guard", values.get("delta_guard", 500), "number"))
     html.append(input_row("Dry-Run (true/false)", "dry_run", values.get("dry_run", True), "text", "True/False"))
     html.append(input_row("Buchungsnotiz", "note_text", values.get("note_text", "Korrektur durch Onlineshop")))
     html.append(input_row("Nur Kategorien (IDs, komma-getrennt)", "filter_category_ids", values.get("filter_category_ids", "")))
     html.append(input_row("Throttle pro Artikel (ms)", "throttle_ms", values.get("throttle_ms", 600), "number"))
     html.append(input_row("Max. Artikel pro Lauf", "max_parts_per_run", values.get("max_parts_per_run", 40), "number"))
+    html.append(input_row("Max. Laufzeit pro Lauf (s)", "run_deadline_s", values.get("run_deadline_s", 300), "number"))
+    html.append(input_row("Circuit-Breaker Schwelle", "breaker_threshold", values.get("breaker_threshold", 5), "number"))
+    html.append(input_row("Circuit-Breaker Pause (s)", "breaker_cooldown_s", values.get("breaker_cooldown_s", 60), "number"))
+    html.append(input_row("Shards (Hintergrund-Tasks)", "shard_count", values.get("shard_count", 1), "number"))
+    html.append(input_row("Shopify-Requests pro Sekunde (alle Shards)", "shared_rate_per_s", values.get("shared_rate_per_s", 2), "number"))
+    html.append(input_row("Plan gültig (Minuten)", "plan_ttl_minutes", values.get("plan_ttl_minutes", 30), "number"))
 
     html.append("<div class='row'><button class='btn primary' type='submit'>Speichern</button> <a class='btn' href='../'>Zurück</a></div>")
     html.append("</form>")
@@ -256,4 +275,69 @@ def missing_report(request):
         v = client.find_variant_by_sku(ipn)
         (missing if not v else present).append({"part": part.pk, "ipn": ipn})
 
-    return JsonResponse({"ok": True, "missing": missing, "present": present})
\ No newline at end of file
+    return JsonResponse({"ok": True, "missing": missing, "present": present})
+
+
+@login_required
+def last_run(request):
+    if not _allowed(request.user):
+        return HttpResponseForbidden("insufficient permissions")
+    res = get_last_run()
+    if res is None:
+        return JsonResponse({"ok": False, "error": "kein Lauf gespeichert"})
+    return JsonResponse({"ok": True, "run": res})
+
+
+def _int_param(request, name, default):
+    try:
+        return int(request.GET.get(name, default))
+    except (TypeError, ValueError):
+        return default
+
+
+@login_required
+def plan(request):
+    """
+    POST reiht die Berechnung eines neuen Plans als Hintergrund-Task ein (continue=<id> setzt einen
+    unvollständigen Plan fort) und liefert die Plan-ID. GET ?id= liefert Status und eine Seite des Plans,
+    GET ohne id die ID des zuletzt gestarteten Plans; GET berechnet nie selbst.
+    """
+    if not _allowed(request.user):
+        return HttpResponseForbidden("insufficient permissions")
+    p = _plugin()
+    if p is None:
+        return HttpResponseForbidden("plugin not loaded")
+
+    if request.method == "POST":
+        continue_id = (request.POST.get("continue") or "").strip()
+        return JsonResponse(start_plan(p, continue_id=continue_id or None))
+
+    plan_id = (request.GET.get("id") or "").strip()
+    if not plan_id:
+        last_id = get_last_plan_id()
+        if not last_id:
+            return JsonResponse({"ok": False, "error": "kein Plan gespeichert, per POST starten"})
+        return JsonResponse({"ok": True, "plan_id": last_id})
+
+    page = _int_param(request, "page", 1)
+    page_size = _int_param(request, "page_size", 50)
+    return JsonResponse(get_plan_page(plan_id, page=page, page_size=page_size))
+
+
+@login_required
+@require_POST
+def plan_apply(request):
+    if not _allowed(request.user):
+        return HttpResponseForbidden("insufficient permissions")
+    p = _plugin()
+    if p is None:
+        return HttpResponseForbidden("plugin not loaded")
+
+    plan_id = (request.POST.get("id") or "").strip()
+    if not plan_id:
+        return JsonResponse({"ok": False, "error": "param id fehlt"})
+
+    res = apply_plan(p, request.user, plan_id)
+    if res.get("ok"):
+        record_run(p, res, user=request.user)
+    return JsonResponse(res)
\ No newline at end of file